@@ -3,16 +3,55 @@
 Contains systemd related help files
 '''
 # import python libs
+import functools
+import json
 import logging
 import os
 import re
 import subprocess
+import threading
 
 from hubblestack.exceptions import HubbleInvocationError
 import hubblestack.utils.stringutils
 
+try:
+    from pystemd.systemd1 import Manager
+    HAS_PYSTEMD = True
+except ImportError:
+    HAS_PYSTEMD = False
+
 log = logging.getLogger(__name__)
 
+# systemd version memoized for the life of the process. Only set once the
+# version has been determined, so a failed lookup is retried on the next call.
+_version_cache = None
+
+_VERSION_RE = re.compile(r'^systemd\s+(\d+)')
+
+# Seconds to wait for systemd to report its version, over D-Bus or systemctl
+_SYSTEMD_TIMEOUT = 2
+
+# The systemd version is also cached on disk so that short-lived hubble
+# invocations don't each have to ask systemd for it. The entry is keyed on the
+# inode and mtime of the systemd binary, so an upgrade invalidates it. Set
+# _DISK_CACHE_PATH to None to disable the disk cache.
+_DISK_CACHE_PATH = '/run/hubblestack/systemd-cache'
+_SYSTEMD_BINARIES = ('/usr/lib/systemd/systemd', '/lib/systemd/systemd')
+
+
+def _check_context(context):
+    '''
+    Return the loader context dict if one was passed, None if it wasn't. Raise
+    HubbleInvocationError for anything else.
+    '''
+    # Check for the common None and plain dict cases before falling back to
+    # isinstance() for dict subclasses
+    if context is None or type(context) is dict:  # pylint: disable=unidiomatic-typecheck
+        return context
+    if isinstance(context, dict):
+        return context
+    raise HubbleInvocationError('context must be a dictionary if passed')
+
 
 def booted(context=None):
     '''
@@ -22,69 +61,213 @@ def booted(context=None):
     keep the logic below from needing to be run again during the same salt run.
     '''
     contextkey = 'hubblestack.utils.systemd.booted'
-    if isinstance(context, dict):
-        # Can't put this if block on the same line as the above if block,
-        # because it willl break the elif below.
-        if contextkey in context:
-            return context[contextkey]
-    elif context is not None:
-        raise HubbleInvocationError('context must be a dictionary if passed')
+    context = _check_context(context)
+    if context is not None and contextkey in context:
+        return context[contextkey]
 
-    try:
-        # This check does the same as sd_booted() from libsystemd-daemon:
-        # http://www.freedesktop.org/software/systemd/man/sd_booted.html
-        ret = bool(os.stat('/run/systemd/system'))
-    except OSError:
-        ret = False
+    ret = _booted_uncached()
 
-    try:
+    if context is not None:
         context[contextkey] = ret
-    except TypeError:
-        pass
 
     return ret
 
+
+@functools.lru_cache(maxsize=None)
+def _booted_uncached():
+    '''
+    Perform the actual systemd-booted check. The result is cached for the life
+    of the process, use ``_booted_uncached.cache_clear()`` to reset it.
+    '''
+    # This check does the same as sd_booted() from libsystemd-daemon:
+    # http://www.freedesktop.org/software/systemd/man/sd_booted.html
+    return os.path.isdir('/run/systemd/system')
+
+
 def has_scope(context=None):
     '''
     Scopes were introduced in systemd 205, this function returns a boolean
     which is true when the minion is systemd-booted and running systemd>=205.
+    If the loader context dict ``__context__`` is passed, the result is stored
+    under the ``hubblestack.utils.systemd.has_scope`` key.
     '''
+    contextkey = 'hubblestack.utils.systemd.has_scope'
+    context = _check_context(context)
+    if context is not None and contextkey in context:
+        return context[contextkey]
+
     if not booted(context):
-        return False
-    _sd_version = version(context)
-    if _sd_version is None:
-        return False
-    return _sd_version >= 205
+        ret = False
+    else:
+        _sd_version = version(context)
+        if _sd_version is None:
+            # Like version(), don't remember a result we couldn't determine
+            return False
+        ret = _sd_version >= 205
+
+    if context is not None:
+        context[contextkey] = ret
+    return ret
+
 
 def version(context=None):
     '''
-    Attempts to run systemctl --version. Returns None if unable to determine
-    version.
+    Attempts to determine the systemd version, either over D-Bus or by running
+    systemctl --version. Returns None if unable to determine version.
     '''
     contextkey = 'hubblestack.utils.systemd.version'
-    if isinstance(context, dict):
-        # Can't put this if block on the same line as the above if block,
-        # because it will break the elif below.
-        if contextkey in context:
-            return context[contextkey]
-    elif context is not None:
-        raise HubbleInvocationError('context must be a dictionary if passed')
-    stdout = subprocess.Popen(
-        ['systemctl', '--version'],
-        close_fds=True,
-        stdout=subprocess.PIPE, stderr=subprocess.STDOUT).communicate()[0]
-    outstr = hubblestack.utils.stringutils.to_str(stdout)
+    context = _check_context(context)
+    if context is not None and contextkey in context:
+        return context[contextkey]
+
+    global _version_cache  # pylint: disable=global-statement
+    ret = _version_cache
+    if ret is None:
+        ret = _version_uncached()
+        if ret is None:
+            return None
+        _version_cache = ret
+    if context is not None:
+        context[contextkey] = ret
+    return ret
+
+
+def _version_uncached():
+    '''
+    Determine the systemd version, preferring the manager's D-Bus Version
+    property and falling back to running systemctl --version. Returns None if
+    unable to determine version.
+    '''
+    cache_key = _disk_cache_key()
+    ret = _read_disk_cache(cache_key)
+    if ret is not None:
+        return ret
+
+    outstr = _version_from_dbus()
+    ret = None if outstr is None else _parse_version(outstr)
+    if ret is None:
+        if outstr is not None:
+            log.debug('Unable to parse systemd version read over D-Bus: %s', outstr)
+        outstr = _version_from_systemctl()
+        if outstr is None:
+            return None
+        ret = _parse_version(outstr)
+        if ret is None:
+            log.error(
+                'Unable to determine systemd version, output follows:\n%s',
+                outstr
+            )
+            return None
+    _write_disk_cache(cache_key, ret)
+    return ret
+
+
+def _parse_version(outstr):
+    '''
+    Return the systemd version from the first line of systemctl --version
+    style output, or None if it could not be parsed
+    '''
+    match = _VERSION_RE.match(outstr)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def _disk_cache_key():
+    '''
+    Return the key identifying the installed systemd for the disk cache, or
+    None if the disk cache is disabled or systemd could not be found
+    '''
+    if _DISK_CACHE_PATH is None:
+        return None
+    for path in _SYSTEMD_BINARIES:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        return [st.st_ino, st.st_mtime_ns]
+    return None
+
+
+def _read_disk_cache(cache_key):
+    '''
+    Return the systemd version from the disk cache if it was stored under
+    cache_key, None otherwise
+    '''
+    if cache_key is None:
+        return None
     try:
-        ret = int(re.search(r'\w+ ([0-9]+)', outstr.splitlines()[0]).group(1))
-    except (AttributeError, IndexError, ValueError):
-        log.error(
-            'Unable to determine systemd version from systemctl '
-            '--version, output follows:\n%s', outstr
-        )
+        with open(_DISK_CACHE_PATH, 'r') as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
         return None
-    else:
+    if not isinstance(data, dict) or data.get('key') != cache_key:
+        return None
+    ret = data.get('version')
+    return ret if isinstance(ret, int) else None
+
+
+def _write_disk_cache(cache_key, ver):
+    '''
+    Store the systemd version in the disk cache under cache_key
+    '''
+    if cache_key is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(_DISK_CACHE_PATH), exist_ok=True)
+        fd = os.open(_DISK_CACHE_PATH,
+                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({'key': cache_key, 'version': ver}, fh)
+    except OSError as exc:
+        log.debug('Unable to write systemd version cache %s: %s',
+                  _DISK_CACHE_PATH, exc)
+
+
+def _version_from_dbus():
+    '''
+    Read the Version property of org.freedesktop.systemd1.Manager over D-Bus.
+    The value is returned in the same form as the first line of systemctl
+    --version, or None if D-Bus is unavailable or doesn't answer within
+    _SYSTEMD_TIMEOUT seconds.
+    '''
+    if not HAS_PYSTEMD:
+        return None
+    result = {}
+
+    def _read():
         try:
-            context[contextkey] = ret
-        except TypeError:
-            pass
-        return ret
\ No newline at end of file
+            manager = Manager()
+            manager.load()
+            result['version'] = manager.Manager.Version
+        except Exception as exc:  # pylint: disable=broad-except
+            result['error'] = exc
+
+    # pystemd has no per-call timeout and sd-bus waits up to 25 seconds, so
+    # read in a daemon thread and give up on it if it takes too long
+    reader = threading.Thread(target=_read, name='systemd-version', daemon=True)
+    reader.start()
+    reader.join(_SYSTEMD_TIMEOUT)
+    if reader.is_alive():
+        log.debug('Timed out reading systemd version over D-Bus')
+        return None
+    if 'error' in result:
+        log.debug('Unable to read systemd version over D-Bus: %s', result['error'])
+        return None
+    return 'systemd {0}'.format(hubblestack.utils.stringutils.to_str(result['version']))
+
+
+def _version_from_systemctl():
+    '''
+    Run systemctl --version and return its output, or None if systemctl could
+    not be run
+    '''
+    try:
+        proc = subprocess.run(
+            ['systemctl', '--version'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            timeout=_SYSTEMD_TIMEOUT, check=False)
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        log.error('Unable to run systemctl --version: %s', exc)
+        return None
+    return hubblestack.utils.stringutils.to_str(proc.stdout)
@@ -1,23 +1,67 @@
 # -*- coding: utf-8 -*-
 
-import errno
+import json
 import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import pytest
 
 from tests.support.unit import TestCase, skipIf
-from tests.support.mock import Mock, patch, NO_MOCK, NO_MOCK_REASON
+from tests.support.mock import Mock, create_autospec, patch, NO_MOCK, NO_MOCK_REASON
 
 import hubblestack.utils.systemd as _systemd
 from hubblestack.exceptions import HubbleInvocationError
 
+pytestmark = pytest.mark.systemd_unit
+
+_KEY_BOOTED = 'hubblestack.utils.systemd.booted'
+_KEY_VERSION = 'hubblestack.utils.systemd.version'
+_KEY_HAS_SCOPE = 'hubblestack.utils.systemd.has_scope'
+
+# os.path.isdir is patched for the whole test case, keep a reference to the
+# real one so that other paths can still be checked.
+_REAL_ISDIR = os.path.isdir
+_BOOTED_PATHS = {'/run/systemd/system': True}
+_NOT_BOOTED_PATHS = {'/run/systemd/system': False}
+
 
 def _booted_effect(path):
-    return True if path == '/run/systemd/system' else os.stat(path)
+    ret = _BOOTED_PATHS.get(path)
+    return ret if ret is not None else _REAL_ISDIR(path)
 
 
 def _not_booted_effect(path):
-    if path == '/run/systemd/system':
-        raise OSError(errno.ENOENT, 'No such file or directory', path)
-    return os.stat(path)
+    ret = _NOT_BOOTED_PATHS.get(path)
+    return ret if ret is not None else _REAL_ISDIR(path)
+
+
+# systemctl --version first lines seen in the wild, and the version they parse to
+_VERSION_CASES = [
+    ('systemd 239', 239),
+    ('systemd 241 (241)', 241),
+    ('systemd 245 (245.4-4ubuntu3.2)', 245),
+    ('systemd 252 (252.36-1~deb12u1)', 252),
+    ('systemd 256~rc3 (256~rc3-7)', 256),
+    ('systemd 260.1\n', 260),
+]
+
+# Context hits must short-circuit before ever reaching systemctl
+_NO_SUBPROCESS = patch('subprocess.run',
+                       new=Mock(side_effect=AssertionError('systemctl called on context hit')))
+
+
+def _fake_run(output, returncode=0):
+    '''
+    Return an autospecced stand-in for the CompletedProcess returned by
+    subprocess.run
+    '''
+    proc = create_autospec(subprocess.CompletedProcess, instance=True)
+    proc.stdout = output
+    proc.returncode = returncode
+    return proc
 
 
 @skipIf(NO_MOCK, NO_MOCK_REASON)
@@ -25,37 +69,88 @@ class SystemdTestCase(TestCase):
     '''
     Tests the functions in hubblestack.utils.systemd
     '''
+    @classmethod
+    def setUpClass(cls):
+        # Patch os.path.isdir and subprocess.run once for the whole class,
+        # tests only swap out the side effect or return value they need.
+        cls._isdir_patcher = patch('os.path.isdir', side_effect=_REAL_ISDIR)
+        cls._run_patcher = patch('subprocess.run')
+        cls._isdir_mock = cls._isdir_patcher.start()
+        cls._run_mock = cls._run_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._run_patcher.stop()
+        cls._isdir_patcher.stop()
+
+    def setUp(self):
+        self._clear_caches()
+        # Don't leak a mocked result into later tests in the same process
+        self.addCleanup(self._clear_caches)
+        self._isdir_mock.reset_mock(side_effect=True)
+        self._isdir_mock.side_effect = _REAL_ISDIR
+        self._run_mock.reset_mock(return_value=True, side_effect=True)
+        # Exercise the systemctl code path unless a test asks for D-Bus
+        patcher = patch.object(_systemd, 'HAS_PYSTEMD', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Keep the on-disk version cache out of tests unless asked for
+        patcher = patch.object(_systemd, '_DISK_CACHE_PATH', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        # Don't leave a faked /run/systemd/system behind for whatever checks
+        # directories before the class-level patch is stopped
+        self._isdir_mock.side_effect = _REAL_ISDIR
+
+    @staticmethod
+    def _clear_caches():
+        '''
+        booted() and version() memoize their results for the life of the
+        process, so make sure every test starts from a cold cache.
+        '''
+        _systemd._booted_uncached.cache_clear()
+        _systemd._version_cache = None
+
+    def _mock_systemctl(self, output):
+        '''
+        Make systemctl --version produce the given output and return the
+        subprocess.run mock
+        '''
+        self._run_mock.return_value = _fake_run(output)
+        return self._run_mock
+
     def test_booted(self):
         '''
         Test that hubblestack.utils.systemd.booted() returns True when minion is
         systemd-booted.
         '''
-        # Ensure that os.stat returns True. os.stat doesn't return a bool
-        # normally, but the code is doing a simple truth check on the return
-        # data, so it is sufficient enough to mock it as True for these tests.
-        with patch('os.stat', side_effect=_booted_effect):
-            # Test without context dict passed
-            self.assertTrue(_systemd.booted())
-            # Test that context key is set when context dict is passed
-            context = {}
-            self.assertTrue(_systemd.booted(context))
-            self.assertEqual(context, {'hubblestack.utils.systemd.booted': True})
+        # Ensure that /run/systemd/system is seen as a directory
+        self._isdir_mock.side_effect = _booted_effect
+        # Test without context dict passed
+        self.assertTrue(_systemd.booted())
+        # Test that context key is set when context dict is passed
+        context = {}
+        self.assertTrue(_systemd.booted(context))
+        self.assertEqual(context, {_KEY_BOOTED: True})
 
     def test_not_booted(self):
         '''
         Test that hubblestack.utils.systemd.booted() returns False when minion is not
         systemd-booted.
         '''
-        # Ensure that os.stat raises an exception even if test is being run on
-        # a systemd-booted host.
-        with patch('os.stat', side_effect=_not_booted_effect):
-            # Test without context dict passed
-            self.assertFalse(_systemd.booted())
-            # Test that context key is set when context dict is passed
-            context = {}
-            self.assertFalse(_systemd.booted(context))
-            self.assertEqual(context, {'hubblestack.utils.systemd.booted': False})
+        # Ensure that /run/systemd/system is not seen as a directory even if
+        # the test is being run on a systemd-booted host.
+        self._isdir_mock.side_effect = _not_booted_effect
+        # Test without context dict passed
+        self.assertFalse(_systemd.booted())
+        # Test that context key is set when context dict is passed
+        context = {}
+        self.assertFalse(_systemd.booted(context))
+        self.assertEqual(context, {_KEY_BOOTED: False})
 
+    @_NO_SUBPROCESS
     def test_booted_return_from_context(self):
         '''
         Test that the context data is returned when present. To ensure we're
@@ -63,7 +158,7 @@ class SystemdTestCase(TestCase):
         differentiate it from the True/False return this function normally
         produces.
         '''
-        context = {'hubblestack.utils.systemd.booted': 'foo'}
+        context = {_KEY_BOOTED: 'foo'}
         self.assertEqual(_systemd.booted(context), 'foo')
 
     def test_booted_invalid_context(self):
@@ -80,43 +175,173 @@ class SystemdTestCase(TestCase):
         Test that hubblestack.utils.systemd.booted() returns True when minion is
         systemd-booted.
         '''
-        with patch('subprocess.Popen') as popen_mock:
-            _version = 231
-            output = 'systemd {0}\n-SYSVINIT'.format(_version)
-            popen_mock.return_value = Mock(
-                communicate=lambda *args, **kwargs: (output, None),
-                pid=lambda: 12345,
-                retcode=0
-            )
-
-            # Test without context dict passed
-            self.assertEqual(_systemd.version(), _version)
-            # Test that context key is set when context dict is passed
-            context = {}
-            self.assertTrue(_systemd.version(context))
-            self.assertEqual(context, {'hubblestack.utils.systemd.version': _version})
+        _version = 231
+        self._mock_systemctl(f'systemd {_version}\n-SYSVINIT')
+        # Test without context dict passed
+        self.assertEqual(_systemd.version(), _version)
+        # Test that context key is set when context dict is passed
+        context = {}
+        self.assertTrue(_systemd.version(context))
+        self.assertEqual(context, {_KEY_VERSION: _version})
 
     def test_version_generated_from_git_describe(self):
         '''
         Test with version string matching versions generated by git describe
         in systemd. This feature is used in systemd>=241.
         '''
-        with patch('subprocess.Popen') as popen_mock:
-            _version = 241
-            output = 'systemd {0} ({0}.0-0-dist)\n-SYSVINIT'.format(_version)
-            popen_mock.return_value = Mock(
-                communicate=lambda *args, **kwargs: (output, None),
-                pid=lambda: 12345,
-                retcode=0
-            )
-
-            # Test without context dict passed
-            self.assertEqual(_systemd.version(), _version)
-            # Test that context key is set when context dict is passed
-            context = {}
-            self.assertTrue(_systemd.version(context))
-            self.assertEqual(context, {'hubblestack.utils.systemd.version': _version})
+        _version = 241
+        self._mock_systemctl(f'systemd {_version} ({_version}.0-0-dist)\n-SYSVINIT')
+        # Test without context dict passed
+        self.assertEqual(_systemd.version(), _version)
+        # Test that context key is set when context dict is passed
+        context = {}
+        self.assertTrue(_systemd.version(context))
+        self.assertEqual(context, {_KEY_VERSION: _version})
 
+    def test_version_formats(self):
+        '''
+        Test the various version string formats systemd has used over time,
+        including packaging suffixes and release candidates.
+        '''
+        for output, _version in _VERSION_CASES:
+            with self.subTest(output=output):
+                self._clear_caches()
+                self._mock_systemctl(output + '\n+PAM +AUDIT -SYSVINIT')
+                self.assertEqual(_systemd.version(), _version)
+
+    def test_version_cached(self):
+        '''
+        Test that systemctl is only run once, subsequent calls with or without
+        a context dict should be served from the memoized result.
+        '''
+        _version = 231
+        run_mock = self._mock_systemctl(f'systemd {_version}\n-SYSVINIT')
+        self.assertEqual(_systemd.version(), _version)
+        self.assertEqual(_systemd.version(), _version)
+        context = {}
+        self.assertEqual(_systemd.version(context), _version)
+        self.assertEqual(context, {_KEY_VERSION: _version})
+        self.assertEqual(run_mock.call_count, 1)
+
+    def test_version_retried_after_failure(self):
+        '''
+        Test that a version we failed to determine is not memoized, the next
+        call should ask systemctl again.
+        '''
+        run_mock = self._mock_systemctl('invalid')
+        self.assertIsNone(_systemd.version())
+        self._mock_systemctl('systemd 231\n-SYSVINIT')
+        context = {}
+        self.assertEqual(_systemd.version(context), 231)
+        self.assertEqual(context, {_KEY_VERSION: 231})
+        self.assertEqual(run_mock.call_count, 2)
+
+    def test_version_from_dbus(self):
+        '''
+        Test that the version is read from the systemd manager over D-Bus when
+        pystemd is available, without running systemctl.
+        '''
+        manager = Mock()
+        manager.Manager.Version = b'245.4-4ubuntu3.2'
+        with patch.object(_systemd, 'HAS_PYSTEMD', True), \
+                patch.object(_systemd, 'Manager', return_value=manager, create=True):
+            self.assertEqual(_systemd.version(), 245)
+        manager.load.assert_called_once_with()
+        self._run_mock.assert_not_called()
+
+    def test_version_dbus_unavailable(self):
+        '''
+        Test that we fall back to systemctl --version if the D-Bus read fails.
+        '''
+        with patch.object(_systemd, 'HAS_PYSTEMD', True), \
+                patch.object(_systemd, 'Manager', side_effect=OSError, create=True):
+            self._mock_systemctl('systemd 231\n-SYSVINIT')
+            self.assertEqual(_systemd.version(), 231)
+
+    def test_version_dbus_timeout(self):
+        '''
+        Test that we fall back to systemctl --version if systemd doesn't answer
+        over D-Bus in time.
+        '''
+        release = threading.Event()
+        self.addCleanup(release.set)
+        manager = Mock()
+        manager.load.side_effect = release.wait
+        with patch.object(_systemd, 'HAS_PYSTEMD', True), \
+                patch.object(_systemd, '_SYSTEMD_TIMEOUT', 0.05), \
+                patch.object(_systemd, 'Manager', return_value=manager, create=True):
+            self._mock_systemctl('systemd 231\n-SYSVINIT')
+            self.assertEqual(_systemd.version(), 231)
+
+    def test_version_dbus_unparsable(self):
+        '''
+        Test that we fall back to systemctl --version if the version read over
+        D-Bus can't be parsed.
+        '''
+        manager = Mock()
+        manager.Manager.Version = b'unknown'
+        with patch.object(_systemd, 'HAS_PYSTEMD', True), \
+                patch.object(_systemd, 'Manager', return_value=manager, create=True):
+            run_mock = self._mock_systemctl('systemd 231\n-SYSVINIT')
+            self.assertEqual(_systemd.version(), 231)
+        run_mock.assert_called_once()
+
+    def test_version_systemctl_timeout(self):
+        '''
+        Test that a hung systemctl is treated as an unknown version, and that
+        the version is picked up once systemctl responds again.
+        '''
+        self._run_mock.side_effect = subprocess.TimeoutExpired(['systemctl', '--version'], 2)
+        self.assertIsNone(_systemd.version())
+        context = {}
+        self.assertIsNone(_systemd.version(context))
+        self.assertEqual(context, {})
+
+        self._run_mock.side_effect = None
+        self._mock_systemctl('systemd 231\n-SYSVINIT')
+        self.assertEqual(_systemd.version(context), 231)
+        self.assertEqual(context, {_KEY_VERSION: 231})
+
+    def _use_disk_cache(self):
+        '''
+        Point the disk cache at a temporary file and return its path
+        '''
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        cache_path = os.path.join(tmpdir, 'hubblestack', 'systemd-cache')
+        for patcher in (patch.object(_systemd, '_DISK_CACHE_PATH', cache_path),
+                        patch.object(_systemd, '_disk_cache_key', return_value=[1, 2])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return cache_path
+
+    def test_disk_cache_hit(self):
+        '''
+        Test that a version found in the disk cache is returned without asking
+        systemd for it
+        '''
+        cache_path = self._use_disk_cache()
+        os.makedirs(os.path.dirname(cache_path))
+        with open(cache_path, 'w') as fh:
+            json.dump({'key': [1, 2], 'version': 245}, fh)
+        self._run_mock.side_effect = AssertionError('systemctl called')
+        self.assertEqual(_systemd.version(), 245)
+
+    def test_disk_cache_miss(self):
+        '''
+        Test that a stale disk cache entry is ignored and replaced with the
+        version reported by systemctl
+        '''
+        cache_path = self._use_disk_cache()
+        os.makedirs(os.path.dirname(cache_path))
+        with open(cache_path, 'w') as fh:
+            json.dump({'key': [1, 1], 'version': 245}, fh)
+        self._mock_systemctl('systemd 231\n-SYSVINIT')
+        self.assertEqual(_systemd.version(), 231)
+        with open(cache_path) as fh:
+            self.assertEqual(json.load(fh), {'key': [1, 2], 'version': 231})
+
+    @_NO_SUBPROCESS
     def test_version_return_from_context(self):
         '''
         Test that the context data is returned when present. To ensure we're
@@ -124,7 +349,7 @@ class SystemdTestCase(TestCase):
         differentiate it from the integer return this function normally
         produces.
         '''
-        context = {'hubblestack.utils.systemd.version': 'foo'}
+        context = {_KEY_VERSION: 'foo'}
         self.assertEqual(_systemd.version(context), 'foo')
 
     def test_version_invalid_context(self):
@@ -141,106 +366,28 @@ class SystemdTestCase(TestCase):
         Test with invalid context data. The context value must be a dict, so
         this should raise a HubbleInvocationError.
         '''
-        with patch('subprocess.Popen') as popen_mock:
-            popen_mock.return_value = Mock(
-                communicate=lambda *args, **kwargs: ('invalid', None),
-                pid=lambda: 12345,
-                retcode=0
-            )
-            # Test without context dict passed
-            self.assertIsNone(_systemd.version())
-            # Test that context key is set when context dict is passed. A failure
-            # to parse the systemctl output should not set a context key, so it
-            # should not be present in the context dict.
-            context = {}
-            self.assertIsNone(_systemd.version(context))
-            self.assertEqual(context, {})
-
-    def test_has_scope_systemd204(self):
-        '''
-        Scopes are available in systemd>=205. Make sure that this function
-        returns the expected boolean. We do three separate unit tests for
-        versions 204 through 206 because mock doesn't like us altering the
-        return_value in a loop.
-        '''
-        with patch('subprocess.Popen') as popen_mock:
-            _expected = False
-            _version = 204
-            _output = 'systemd {0}\n-SYSVINIT'.format(_version)
-            popen_mock.return_value = Mock(
-                communicate=lambda *args, **kwargs: (_output, None),
-                pid=lambda: 12345,
-                retcode=0
-            )
-            # Ensure that os.stat returns True. os.stat doesn't return a bool
-            # normally, but the code is doing a simple truth check on the
-            # return data, so it is sufficient enough to mock it as True for
-            # these tests.
-            with patch('os.stat', side_effect=_booted_effect):
-                # Test without context dict passed
-                self.assertEqual(_systemd.has_scope(), _expected)
-                # Test that context key is set when context dict is passed
-                context = {}
-                self.assertEqual(_systemd.has_scope(context), _expected)
-                self.assertEqual(
-                    context,
-                    {'hubblestack.utils.systemd.booted': True,
-                     'hubblestack.utils.systemd.version': _version},
-                )
+        self._mock_systemctl('invalid')
+        # Test without context dict passed
+        self.assertIsNone(_systemd.version())
+        # Test that context key is set when context dict is passed. A failure
+        # to parse the systemctl output should not set a context key, so it
+        # should not be present in the context dict.
+        context = {}
+        self.assertIsNone(_systemd.version(context))
+        self.assertEqual(context, {})
 
-    def test_has_scope_systemd205(self):
+    def test_has_scope_by_version(self):
         '''
         Scopes are available in systemd>=205. Make sure that this function
-        returns the expected boolean. We do three separate unit tests for
-        versions 204 through 206 because mock doesn't like us altering the
-        return_value in a loop.
-        '''
-        with patch('subprocess.Popen') as popen_mock:
-            _expected = True
-            _version = 205
-            _output = 'systemd {0}\n-SYSVINIT'.format(_version)
-            popen_mock.return_value = Mock(
-                communicate=lambda *args, **kwargs: (_output, None),
-                pid=lambda: 12345,
-                retcode=0
-            )
-            # Ensure that os.stat returns True. os.stat doesn't return a bool
-            # normally, but the code is doing a simple truth check on the
-            # return data, so it is sufficient enough to mock it as True for
-            # these tests.
-            with patch('os.stat', side_effect=_booted_effect):
-                # Test without context dict passed
-                self.assertEqual(_systemd.has_scope(), _expected)
-                # Test that context key is set when context dict is passed
-                context = {}
-                self.assertEqual(_systemd.has_scope(context), _expected)
-                self.assertEqual(
-                    context,
-                    {'hubblestack.utils.systemd.booted': True,
-                     'hubblestack.utils.systemd.version': _version},
-                )
-
-    def test_has_scope_systemd206(self):
+        returns the expected boolean for versions on either side of that
+        boundary.
         '''
-        Scopes are available in systemd>=205. Make sure that this function
-        returns the expected boolean. We do three separate unit tests for
-        versions 204 through 206 because mock doesn't like us altering the
-        return_value in a loop.
-        '''
-        with patch('subprocess.Popen') as popen_mock:
-            _expected = True
-            _version = 206
-            _output = 'systemd {0}\n-SYSVINIT'.format(_version)
-            popen_mock.return_value = Mock(
-                communicate=lambda *args, **kwargs: (_output, None),
-                pid=lambda: 12345,
-                retcode=0
-            )
-            # Ensure that os.stat returns True. os.stat doesn't return a bool
-            # normally, but the code is doing a simple truth check on the
-            # return data, so it is sufficient enough to mock it as True for
-            # these tests.
-            with patch('os.stat', side_effect=_booted_effect):
+        for _version, _expected in [(204, False), (205, True), (206, True)]:
+            with self.subTest(version=_version):
+                self._clear_caches()
+                self._mock_systemctl(f'systemd {_version}\n-SYSVINIT')
+                # Ensure that /run/systemd/system is seen as a directory
+                self._isdir_mock.side_effect = _booted_effect
                 # Test without context dict passed
                 self.assertEqual(_systemd.has_scope(), _expected)
                 # Test that context key is set when context dict is passed
@@ -248,8 +395,8 @@ class SystemdTestCase(TestCase):
                 self.assertEqual(_systemd.has_scope(context), _expected)
                 self.assertEqual(
                     context,
-                    {'hubblestack.utils.systemd.booted': True,
-                     'hubblestack.utils.systemd.version': _version},
+                    {_KEY_BOOTED: True, _KEY_VERSION: _version,
+                     _KEY_HAS_SCOPE: _expected},
                 )
 
     def test_has_scope_no_systemd(self):
@@ -257,37 +404,49 @@ class SystemdTestCase(TestCase):
         Test the case where the system is not systemd-booted. We should not be
         performing a version check in these cases as there is no need.
         '''
-        with patch('os.stat', side_effect=_not_booted_effect):
-            # Test without context dict passed
-            self.assertFalse(_systemd.has_scope())
-            # Test that context key is set when context dict is passed.
-            # Because we are not systemd-booted, there should be no key in the
-            # context dict for the version check, as we shouldn't have
-            # performed this check.
-            context = {}
-            self.assertFalse(_systemd.has_scope(context))
-            self.assertEqual(context, {'hubblestack.utils.systemd.booted': False})
+        self._isdir_mock.side_effect = _not_booted_effect
+        # Test without context dict passed
+        self.assertFalse(_systemd.has_scope())
+        # Test that context key is set when context dict is passed.
+        # Because we are not systemd-booted, there should be no key in the
+        # context dict for the version check, as we shouldn't have
+        # performed this check.
+        context = {}
+        self.assertFalse(_systemd.has_scope(context))
+        self.assertEqual(context, {_KEY_BOOTED: False, _KEY_HAS_SCOPE: False})
 
     def test_has_scope_version_parse_problem(self):
         '''
         Test the case where the system is systemd-booted, but we failed to
         parse the "systemctl --version" output.
         '''
-        with patch('subprocess.Popen') as popen_mock:
-            popen_mock.return_value = Mock(
-                communicate=lambda *args, **kwargs: ('invalid', None),
-                pid=lambda: 12345,
-                retcode=0
-            )
-            with patch('os.stat', side_effect=_booted_effect):
-                # Test without context dict passed
-                self.assertFalse(_systemd.has_scope())
-                # Test that context key is set when context dict is passed. A
-                # failure to parse the systemctl output should not set a context
-                # key, so it should not be present in the context dict.
-                context = {}
-                self.assertFalse(_systemd.has_scope(context))
-                self.assertEqual(context, {'hubblestack.utils.systemd.booted': True})
+        self._mock_systemctl('invalid')
+        self._isdir_mock.side_effect = _booted_effect
+        # Test without context dict passed
+        self.assertFalse(_systemd.has_scope())
+        # Test that context key is set when context dict is passed. A
+        # failure to parse the systemctl output should not set a context
+        # key, so it should not be present in the context dict.
+        context = {}
+        self.assertFalse(_systemd.has_scope(context))
+        self.assertEqual(context, {_KEY_BOOTED: True})
+
+    def test_has_scope_warm_cache(self):
+        '''
+        Test that once has_scope() has stored its result in the context dict,
+        later calls with that context are answered from it alone.
+        '''
+        self._mock_systemctl('systemd 231\n-SYSVINIT')
+        self._isdir_mock.side_effect = _booted_effect
+        context = {}
+        self.assertTrue(_systemd.has_scope(context))
+        self.assertTrue(context[_KEY_HAS_SCOPE])
+
+        self._clear_caches()
+        del context[_KEY_BOOTED], context[_KEY_VERSION]
+        self._run_mock.side_effect = AssertionError('systemctl called')
+        self._isdir_mock.side_effect = AssertionError('booted check performed')
+        self.assertTrue(_systemd.has_scope(context))
 
     def test_has_scope_invalid_context(self):
         '''